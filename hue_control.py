@@ -2,17 +2,34 @@
 """Hue Ready Lamp — Claude Code status indicator via Philips Hue."""
 
 import json
+import os
+import socket
+import subprocess
 import sys
 import time
-from pathlib import Path
-
-import requests
-
-CONFIG_PATH = Path.home() / ".hue-claude" / "config.json"
-SESSIONS_DIR = Path.home() / ".hue-claude" / "sessions"
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Dict, Iterator, Optional, Tuple
+
+if TYPE_CHECKING:
+    import asyncio
+    import sqlite3
+
+    import urllib3
+
+# Plain os.path strings and lazy imports keep startup cheap for hooks that
+# never reach the bridge (daemon hand-off, deduplicated PUTs)
+CONFIG_DIR = os.path.join(os.path.expanduser("~"), ".hue-claude")
+CONFIG_PATH = os.path.join(CONFIG_DIR, "config.json")
+SESSIONS_DIR = os.path.join(CONFIG_DIR, "sessions")
+REGISTRY_PATH = os.path.join(SESSIONS_DIR, "sessions.sqlite")
+WINNER_PATH = os.path.join(SESSIONS_DIR, ".winner")
+CLEANUP_PATH = os.path.join(SESSIONS_DIR, ".last_cleanup")
+LAST_STATE_PATH = os.path.join(SESSIONS_DIR, ".last_bridge_state")
+DAEMON_SOCKET = os.path.join(SESSIONS_DIR, ".pipe")
+DAEMON_LOCK = os.path.join(SESSIONS_DIR, ".daemon.lock")
 
 # CIE xy color coordinates and brightness for each state
-STATES = {
+STATES: Dict[str, Dict[str, Any]] = {
     "thinking": {
         "on": True,
         "xy": [0.1530, 0.0820],  # Blue
@@ -54,6 +71,13 @@ STATES = {
     },
 }
 
+# Request bodies are serialized once here rather than on every PUT
+STATE_BODIES = {name: json.dumps(state).encode() for name, state in STATES.items()}
+# States with a pulsing alert are always sent, so each new one re-triggers the pulse
+PULSING_STATES = frozenset(name for name, state in STATES.items() if state.get("alert") == "lselect")
+# The bridge doesn't do keep-alive, so ask it to close right after responding
+_JSON_HEADERS = {"Content-Type": "application/json", "Connection": "close"}
+
 # Priority: higher number wins when multiple sessions are active
 STATE_PRIORITY = {
     "off": 0,
@@ -71,105 +95,589 @@ SUCCESS_DURATION = 5
 # Sessions older than this are considered stale and cleaned up (seconds)
 STALE_THRESHOLD = 3600
 
+# Stale cleanup runs at most this often (seconds)
+CLEANUP_INTERVAL = 300
+
+# A repeat of the last state sent is skipped for this long, so changes made
+# from the Hue app are still corrected eventually (seconds; one lselect pulse)
+LAST_STATE_TTL = 15
+
+# Re-registering the same state within this window leaves the row untouched (seconds)
+REGISTER_DEDUPE_WINDOW = 0.5
+
+# The daemon waits this long after an update before sending, so bursts collapse into one PUT (seconds)
+COALESCE_DELAY = 0.08
+
+# The daemon exits after this long without updates (seconds)
+DAEMON_IDLE_TIMEOUT = 600
+
+# The daemon relies on unix sockets and fork/exec
+DAEMON_SUPPORTED = os.name == "posix" and hasattr(socket, "AF_UNIX")
+
+# Shared connection pool so consecutive bridge calls reuse one connection
+_POOL: Optional["urllib3.PoolManager"] = None
 
-def load_config():
-    if not CONFIG_PATH.exists():
+# Bumped whenever migrate_registry gains a step
+SCHEMA_VERSION = 1
+
+# Shared connection to the session registry
+_DB: Optional["sqlite3.Connection"] = None
+
+
+def script_path() -> str:
+    """Return the path of this script, for launching background processes.
+
+    Always the .py source, and looked up on the module object at call time
+    so it also resolves correctly when imported from a mypyc-compiled build.
+    """
+    module_file = sys.modules[__name__].__file__ or __file__
+    return os.path.join(os.path.dirname(os.path.abspath(module_file)), "hue_control.py")
+
+
+def load_config() -> Dict[str, Any]:
+    if not os.path.exists(CONFIG_PATH):
         print(f"Config not found at {CONFIG_PATH}. Run hue_setup.py first.", file=sys.stderr)
         sys.exit(1)
     with open(CONFIG_PATH) as f:
-        return json.load(f)
+        config: Dict[str, Any] = json.load(f)
+    return config
 
 
-def set_light_state(config, state_name):
-    if state_name not in STATES:
-        print(f"Unknown state: {state_name}", file=sys.stderr)
-        print(f"Valid states: {', '.join(STATES.keys())}", file=sys.stderr)
-        sys.exit(1)
+def read_small_file(path: str) -> Optional[bytes]:
+    """Return the contents of a small sidecar file, or None if it can't be read.
+
+    Uses a single raw read; everything stored this way is well under 256 bytes.
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return None
+    try:
+        return os.read(fd, 256)
+    finally:
+        os.close(fd)
+
+
+def last_sent_state_is(state_name: str) -> bool:
+    """Return True if state_name was the last state sent, within LAST_STATE_TTL."""
+    if read_small_file(LAST_STATE_PATH) != state_name.encode():
+        return False
+    try:
+        return time.time() - os.path.getmtime(LAST_STATE_PATH) < LAST_STATE_TTL
+    except OSError:
+        return False
+
+
+class BridgeError(Exception):
+    """The Hue Bridge could not be reached."""
+
+
+def get_pool() -> "urllib3.PoolManager":
+    """Return the shared connection pool, importing urllib3 on first use."""
+    global _POOL
+    if _POOL is None:
+        import urllib3
+
+        # urllib3 sets TCP_NODELAY on its sockets, so the small PUT isn't held back by Nagle
+        _POOL = urllib3.PoolManager(num_pools=1, maxsize=4, retries=False)
+    return _POOL
+
+
+def send_light_state(config: Dict[str, Any], state_name: str, force: bool = False) -> None:
+    """PUT a state to the bridge. Raises BridgeError on failure.
+
+    The PUT is skipped when the state matches the last one sent less than
+    LAST_STATE_TTL ago, unless force is set. Pulsing states are always
+    sent so the alert re-triggers.
+    """
+    if not force and state_name not in PULSING_STATES and last_sent_state_is(state_name):
+        return
 
     bridge_ip = config["bridge_ip"]
     username = config["username"]
     light_id = config["light_id"]
     url = f"http://{bridge_ip}/api/{username}/lights/{light_id}/state"
 
-    state = STATES[state_name]
+    import urllib3
 
     try:
-        requests.put(url, json=state, timeout=5)
-    except requests.RequestException as e:
+        get_pool().request("PUT", url, body=STATE_BODIES[state_name], headers=_JSON_HEADERS, timeout=5.0)
+    except urllib3.exceptions.HTTPError as e:
+        raise BridgeError(e) from e
+
+    os.makedirs(SESSIONS_DIR, exist_ok=True)
+    with open(LAST_STATE_PATH, "w") as f:
+        f.write(state_name)
+
+
+def set_light_state(config: Dict[str, Any], state_name: str, force: bool = False) -> None:
+    if state_name not in STATES:
+        print(f"Unknown state: {state_name}", file=sys.stderr)
+        print(f"Valid states: {', '.join(STATES.keys())}", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        send_light_state(config, state_name, force)
+    except BridgeError as e:
         print(f"Failed to reach Hue Bridge: {e}", file=sys.stderr)
         sys.exit(1)
 
 
-def register_session_state(session_id, state_name):
-    """Write this session's current state to the registry."""
-    SESSIONS_DIR.mkdir(parents=True, exist_ok=True)
-    session_file = SESSIONS_DIR / f"{session_id}.json"
-    data = {"state": state_name, "timestamp": time.time()}
-    session_file.write_text(json.dumps(data))
+def get_db() -> "sqlite3.Connection":
+    """Return the registry connection, creating the schema on first use."""
+    global _DB
+    if _DB is None:
+        import sqlite3
+
+        os.makedirs(SESSIONS_DIR, exist_ok=True)
+        _DB = sqlite3.connect(REGISTRY_PATH, timeout=5, isolation_level=None)
+        _DB.execute("PRAGMA synchronous=NORMAL")
+        if _DB.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            migrate_registry(_DB)
+    return _DB
 
 
-def unregister_session(session_id):
+def migrate_registry(db: "sqlite3.Connection") -> None:
+    """Bring the registry schema up to SCHEMA_VERSION; runs once per database."""
+    # WAL mode is persistent, and can't be switched inside a transaction
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        # Another hook may have migrated while we waited for the lock
+        if db.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, state TEXT NOT NULL, "
+                "priority INTEGER NOT NULL, timestamp REAL NOT NULL)"
+            )
+            # Covering index: resolve_winning_state is answered from the index
+            # alone, in priority order, without touching the table rows
+            db.execute(
+                "CREATE INDEX IF NOT EXISTS sessions_by_priority_state "
+                "ON sessions (priority DESC, timestamp DESC, state)"
+            )
+            db.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+    except BaseException:
+        db.execute("ROLLBACK")
+        raise
+    db.execute("COMMIT")
+
+
+@contextmanager
+def registry_transaction() -> Iterator["sqlite3.Connection"]:
+    """Run the enclosed registry reads and writes as one IMMEDIATE transaction."""
+    db = get_db()
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        yield db
+    except BaseException:
+        db.execute("ROLLBACK")
+        raise
+    db.execute("COMMIT")
+
+
+def register_session_state(session_id: str, state_name: str) -> None:
+    """Write this session's current state to the registry.
+
+    A repeat of the same state within REGISTER_DEDUPE_WINDOW changes
+    nothing, so no page is dirtied and nothing is written to the WAL.
+    """
+    get_db().execute(
+        "INSERT INTO sessions (session_id, state, priority, timestamp) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT (session_id) DO UPDATE SET "
+        "state = excluded.state, priority = excluded.priority, timestamp = excluded.timestamp "
+        "WHERE sessions.state != excluded.state OR excluded.timestamp - sessions.timestamp > ?",
+        (session_id, state_name, STATE_PRIORITY[state_name], time.time(), REGISTER_DEDUPE_WINDOW),
+    )
+
+
+def read_session_summary(session_id: str) -> Tuple[Optional[str], int]:
+    """Return (this session's registered state or None, number of registered sessions)."""
+    count, previous = get_db().execute(
+        "SELECT COUNT(*), MAX(CASE WHEN session_id = ? THEN state END) FROM sessions",
+        (session_id,),
+    ).fetchone()
+    return previous, count
+
+
+def unregister_session(session_id: str) -> None:
     """Remove this session from the registry."""
-    session_file = SESSIONS_DIR / f"{session_id}.json"
+    get_db().execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+
+def cleanup_stale_sessions() -> None:
+    """Remove sessions older than STALE_THRESHOLD, at most once per CLEANUP_INTERVAL."""
     try:
-        session_file.unlink()
+        if time.time() - os.path.getmtime(CLEANUP_PATH) < CLEANUP_INTERVAL:
+            return
+    except OSError:
+        pass
+
+    db = get_db()
+    open(CLEANUP_PATH, "a").close()
+    os.utime(CLEANUP_PATH)
+    cursor = db.execute("DELETE FROM sessions WHERE timestamp < ?", (time.time() - STALE_THRESHOLD,))
+
+    # The cached winner may have belonged to a session that just went away
+    if cursor.rowcount > 0:
+        clear_cached_winner()
+
+
+def resolve_winning_state() -> str:
+    """Return the highest-priority state among live sessions, or 'off'."""
+    row = get_db().execute(
+        "SELECT state FROM sessions WHERE timestamp > ? ORDER BY priority DESC, timestamp DESC LIMIT 1",
+        (time.time() - STALE_THRESHOLD,),
+    ).fetchone()
+    return row[0] if row else "off"
+
+
+def live_session_outranks(priority: int) -> bool:
+    """Return True if a live session holds a state above the given priority."""
+    row = get_db().execute(
+        "SELECT 1 FROM sessions WHERE priority > ? AND timestamp > ? LIMIT 1",
+        (priority, time.time() - STALE_THRESHOLD),
+    ).fetchone()
+    return row is not None
+
+
+def read_cached_winner() -> Optional[Tuple[str, int]]:
+    """Return (state, priority) from the last resolution, or None if not cached."""
+    raw = read_small_file(WINNER_PATH)
+    if raw is None:
+        return None
+    try:
+        data = json.loads(raw)
+        return data["state"], data["priority"]
+    except (json.JSONDecodeError, KeyError, TypeError):
+        return None
+
+
+def write_cached_winner(state_name: str) -> None:
+    """Atomically record the current winning state."""
+    os.makedirs(SESSIONS_DIR, exist_ok=True)
+    data = {"state": state_name, "priority": STATE_PRIORITY[state_name], "timestamp": time.time()}
+    tmp_path = f"{WINNER_PATH}.{os.getpid()}"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, WINNER_PATH)
+
+
+def clear_cached_winner() -> None:
+    """Drop the cached winner so the next invocation rescans."""
+    try:
+        os.unlink(WINNER_PATH)
     except FileNotFoundError:
         pass
 
 
-def cleanup_stale_sessions():
-    """Remove session files older than STALE_THRESHOLD."""
-    if not SESSIONS_DIR.exists():
+def update_session_state(session_id: str, state_name: str) -> str:
+    """Register this session's state and return the state the lamp should show.
+
+    The registry is only re-resolved when the cached winner could have
+    changed: the new state is lower than the winner and this session was
+    the one holding it. A session alone in the registry wins outright.
+    A state at or above the cached winner is still checked against the
+    live rows, so a stale cache can never outrank another session.
+    Everything, including the cached winner write, happens inside one
+    transaction so concurrent hooks can't interleave their decisions.
+    """
+    with registry_transaction():
+        previous, count = read_session_summary(session_id)
+        register_session_state(session_id, state_name)
+
+        if count == 0 or (count == 1 and previous is not None):
+            write_cached_winner(state_name)
+            return state_name
+
+        cached = read_cached_winner()
+        if cached is not None:
+            cached_state, cached_priority = cached
+            new_priority = STATE_PRIORITY[state_name]
+            if new_priority >= cached_priority:
+                if not live_session_outranks(new_priority):
+                    write_cached_winner(state_name)
+                    return state_name
+            elif previous != cached_state:
+                return cached_state
+
+        winning = resolve_winning_state()
+        write_cached_winner(winning)
+        return winning
+
+
+def end_session(session_id: str) -> str:
+    """Unregister this session and return the state the lamp should show."""
+    with registry_transaction():
+        previous, count = read_session_summary(session_id)
+        unregister_session(session_id)
+
+        if count - (previous is not None) == 0:
+            write_cached_winner("off")
+            return "off"
+
+        cached = read_cached_winner()
+        if cached is not None and previous != cached[0]:
+            return cached[0]
+
+        winning = resolve_winning_state()
+        write_cached_winner(winning)
+        return winning
+
+
+def notify_daemon(session_id: str, state_name: str) -> bool:
+    """Send a state update to the coalescing daemon. Returns False if it isn't running."""
+    if not DAEMON_SUPPORTED:
+        return False
+    message = json.dumps({"session_id": session_id, "state": state_name}).encode() + b"\n"
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(1)
+            sock.connect(DAEMON_SOCKET)
+            sock.sendall(message)
+    except OSError:
+        return False
+    return True
+
+
+def start_daemon() -> None:
+    """Launch the coalescing daemon in the background for later invocations."""
+    if not DAEMON_SUPPORTED:
         return
-    now = time.time()
-    for f in SESSIONS_DIR.iterdir():
-        if not f.suffix == ".json":
-            continue
-        try:
-            data = json.loads(f.read_text())
-            if now - data.get("timestamp", 0) > STALE_THRESHOLD:
-                f.unlink()
-        except (json.JSONDecodeError, OSError):
-            # Corrupted file — remove it
+    subprocess.Popen(
+        [sys.executable, script_path(), "--daemon"],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+class CoalescingDaemon:
+    """Debounces bridge updates for all sessions.
+
+    Each update is written to the registry and (re)schedules a flush
+    COALESCE_DELAY seconds out, so a burst of hook calls results in a
+    single winner resolution and PUT. The winner is always resolved from
+    the registry, so writes made by clients that ran before the socket
+    was bound, or without the daemon, are never missed.
+
+    A success is demoted to "session" by a timer SUCCESS_DURATION later,
+    which does nothing if the session has reported another state since.
+    """
+
+    def __init__(self, loop: "asyncio.AbstractEventLoop") -> None:
+        self.loop = loop
+        self.server: Optional["asyncio.AbstractServer"] = None
+        self.pending_flush: Optional["asyncio.TimerHandle"] = None
+        self.idle_timer: Optional["asyncio.TimerHandle"] = None
+        self.success_timers: Dict[str, "asyncio.TimerHandle"] = {}
+
+    async def serve(self) -> None:
+        import asyncio
+
+        self.server = await asyncio.start_unix_server(self.handle_client, path=DAEMON_SOCKET)
+        self.reset_idle_timer()
+        async with self.server:
             try:
-                f.unlink()
-            except OSError:
+                await self.server.serve_forever()
+            except asyncio.CancelledError:
                 pass
 
+    def reset_idle_timer(self) -> None:
+        if self.idle_timer is not None:
+            self.idle_timer.cancel()
+        self.idle_timer = self.loop.call_later(DAEMON_IDLE_TIMEOUT, self.stop)
 
-def resolve_winning_state():
-    """Read all session files and return the highest-priority state, or 'off'."""
-    if not SESSIONS_DIR.exists():
-        return "off"
+    def stop(self) -> None:
+        if self.server is not None:
+            self.server.close()
 
-    best_state = "off"
-    best_priority = STATE_PRIORITY["off"]
+    async def handle_client(self, reader: "asyncio.StreamReader", writer: "asyncio.StreamWriter") -> None:
+        try:
+            line = await reader.readline()
+        finally:
+            writer.close()
 
-    for f in SESSIONS_DIR.iterdir():
-        if not f.suffix == ".json":
-            continue
         try:
-            data = json.loads(f.read_text())
-            state = data.get("state", "off")
-            priority = STATE_PRIORITY.get(state, 0)
-            if priority > best_priority:
-                best_priority = priority
-                best_state = state
-        except (json.JSONDecodeError, OSError):
-            continue
+            message = json.loads(line)
+            session_id = str(message["session_id"])
+            state_name = message["state"]
+        except (json.JSONDecodeError, KeyError, TypeError):
+            return
+        if state_name not in STATES:
+            return
+
+        self.update(session_id, state_name)
+        self.reset_idle_timer()
+
+    def update(self, session_id: str, state_name: str) -> None:
+        """Record a session's new state and schedule a flush."""
+        timer = self.success_timers.pop(session_id, None)
+        if timer is not None:
+            timer.cancel()
+
+        # Clients running without the daemon trust the cached winner, so
+        # drop it along with the registry write; flush() records the new one
+        with registry_transaction():
+            if state_name == "off":
+                unregister_session(session_id)
+            else:
+                register_session_state(session_id, state_name)
+            clear_cached_winner()
+
+        if state_name == "success":
+            self.success_timers[session_id] = self.loop.call_later(
+                SUCCESS_DURATION, self.demote_success, session_id
+            )
+
+        if self.pending_flush is not None:
+            self.pending_flush.cancel()
+        self.pending_flush = self.loop.call_later(COALESCE_DELAY, self.flush)
+
+    def demote_success(self, session_id: str) -> None:
+        """Fall back from success to "session" unless the session has moved on."""
+        self.success_timers.pop(session_id, None)
+        previous, _ = read_session_summary(session_id)
+        if previous == "success":
+            self.update(session_id, "session")
+
+    def flush(self) -> None:
+        """Resolve the winner from the registry and send it to the bridge."""
+        self.pending_flush = None
+
+        cleanup_stale_sessions()
+        with registry_transaction():
+            winning = resolve_winning_state()
+            write_cached_winner(winning)
+
+        try:
+            send_light_state(load_config(), winning)
+        except BridgeError as e:
+            print(f"Failed to reach Hue Bridge: {e}", file=sys.stderr)
+
+
+def run_daemon() -> None:
+    """Serve state updates on DAEMON_SOCKET until idle for DAEMON_IDLE_TIMEOUT."""
+    import asyncio
+    import fcntl
+
+    os.makedirs(SESSIONS_DIR, exist_ok=True)
+    lock_file = open(DAEMON_LOCK, "w")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        # Another daemon is already running
+        return
+
+    try:
+        os.unlink(DAEMON_SOCKET)
+    except FileNotFoundError:
+        pass
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(CoalescingDaemon(loop).serve())
+    finally:
+        try:
+            os.unlink(DAEMON_SOCKET)
+        except FileNotFoundError:
+            pass
+        loop.close()
+        lock_file.close()
+
+
+def apply_session_state(config: Dict[str, Any], session_id: str, state_name: str) -> bool:
+    """Hand a session update to the daemon, or apply it directly if none is running.
+
+    Returns True if the daemon took the update.
+    """
+    if notify_daemon(session_id, state_name):
+        return True
 
-    return best_state
+    cleanup_stale_sessions()
+    if state_name == "off":
+        # Session ending — unregister and show whatever remains
+        winning = end_session(session_id)
+    else:
+        winning = update_session_state(session_id, state_name)
+    set_light_state(config, winning)
+
+    # Start the daemon so later updates can be coalesced
+    start_daemon()
+    return False
 
 
-def main():
+def finish_success(config: Dict[str, Any], session_id: Optional[str]) -> None:
+    """Hold the success state, then fall back to "session" (or off without a session)."""
+    time.sleep(SUCCESS_DURATION)
+    if session_id is None:
+        set_light_state(config, "off")
+        return
+
+    # Leave the session alone if it has reported another state in the meantime
+    previous, _ = read_session_summary(session_id)
+    if previous == "success":
+        apply_session_state(config, session_id, "session")
+
+
+def defer_success(config: Dict[str, Any], session_id: Optional[str]) -> None:
+    """Run finish_success in a detached process so the hook returns immediately."""
+    global _POOL, _DB
+
+    if not hasattr(os, "fork"):
+        args = [sys.executable, script_path(), "_deferred_success"]
+        if session_id is not None:
+            args.append(session_id)
+        subprocess.Popen(
+            args,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+        return
+
+    # SQLite connections (and their locks) must not cross a fork, so the
+    # registry is closed first; this is the last thing a hook does with it
+    if _DB is not None:
+        _DB.close()
+        _DB = None
+
+    if os.fork() != 0:
+        return
+
+    # Child: detach from the hook's session and terminal
+    os.setsid()
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(devnull, fd)
+    # Don't share the parent's pooled connection
+    _POOL = None
+    try:
+        finish_success(config, session_id)
+    finally:
+        os._exit(0)
+
+
+def main() -> None:
     if len(sys.argv) < 2:
         print(f"Usage: {sys.argv[0]} <state> [session_id]", file=sys.stderr)
         print(f"States: {', '.join(STATES.keys())}", file=sys.stderr)
         sys.exit(1)
 
+    if sys.argv[1] == "--daemon":
+        run_daemon()
+        return
+
     state_name = sys.argv[1]
     session_id = sys.argv[2] if len(sys.argv) >= 3 else None
 
+    # Hidden subcommand used by defer_success where fork() is unavailable
+    if state_name == "_deferred_success":
+        finish_success(load_config(), session_id)
+        return
+
     if state_name not in STATES:
         print(f"Unknown state: {state_name}", file=sys.stderr)
         print(f"Valid states: {', '.join(STATES.keys())}", file=sys.stderr)
@@ -177,38 +685,20 @@ def main():
 
     config = load_config()
 
-    # No session ID — legacy single-session mode
+    # No session ID — legacy single-session mode, always sent since it is
+    # also how the lamp is controlled by hand
     if session_id is None:
-        set_light_state(config, state_name)
+        set_light_state(config, state_name, force=True)
         if state_name == "success":
-            time.sleep(SUCCESS_DURATION)
-            set_light_state(config, "off")
+            defer_success(config, None)
         return
 
     # Session-aware mode
-    cleanup_stale_sessions()
-
-    if state_name == "off":
-        # Session ending — unregister and show whatever remains
-        unregister_session(session_id)
-        winning = resolve_winning_state()
-        set_light_state(config, winning)
-
-    elif state_name == "success":
-        # Show success, then fall back to "session" (not off)
-        register_session_state(session_id, "success")
-        winning = resolve_winning_state()
-        set_light_state(config, winning)
-        time.sleep(SUCCESS_DURATION)
-        register_session_state(session_id, "session")
-        winning = resolve_winning_state()
-        set_light_state(config, winning)
-
-    else:
-        # Normal state: register and resolve
-        register_session_state(session_id, state_name)
-        winning = resolve_winning_state()
-        set_light_state(config, winning)
+    handed_off = apply_session_state(config, session_id, state_name)
+    if state_name == "success" and not handed_off:
+        # Show success, then fall back to "session" (not off); the daemon
+        # does this itself when it took the update
+        defer_success(config, session_id)
 
 
 if __name__ == "__main__":
@@ -6,19 +6,39 @@ import sys
 import time
 from pathlib import Path
 
-import requests
+import urllib3
 
 CONFIG_DIR = Path.home() / ".hue-claude"
 CONFIG_PATH = CONFIG_DIR / "config.json"
 
+# How long to keep polling for the bridge button press (seconds)
+AUTH_TIMEOUT = 30
 
-def discover_bridge():
+# The button was usually just pressed, so poll quickly for the first few
+# seconds and then settle into a slower interval (seconds)
+AUTH_FAST_POLL_WINDOW = 3
+AUTH_FAST_POLL_INTERVAL = 0.2
+AUTH_POLL_INTERVAL = 1.0
+
+
+def make_pool():
+    """Create one connection pool so every setup step reuses the same connection."""
+    # Verify the HTTPS discovery call against certifi's CA bundle when it is
+    # installed, as requests did; some Python builds ship no system trust store
+    try:
+        import certifi
+    except ImportError:
+        return urllib3.PoolManager(num_pools=2, maxsize=4, retries=False)
+    return urllib3.PoolManager(num_pools=2, maxsize=4, retries=False, ca_certs=certifi.where())
+
+
+def discover_bridge(pool):
     """Find Hue Bridge on the network via Philips discovery API."""
     print("Searching for Hue Bridge on your network...")
     try:
-        resp = requests.get("https://discovery.meethue.com/", timeout=10)
+        resp = pool.request("GET", "https://discovery.meethue.com/", timeout=10.0)
         bridges = resp.json()
-    except (requests.RequestException, json.JSONDecodeError) as e:
+    except (urllib3.exceptions.HTTPError, json.JSONDecodeError) as e:
         print(f"Discovery failed: {e}")
         return None
 
@@ -41,7 +61,7 @@ def discover_bridge():
         print("Invalid choice, try again.")
 
 
-def create_username(bridge_ip):
+def create_username(pool, bridge_ip):
     """Create an API username by having user press the bridge button."""
     url = f"http://{bridge_ip}/api"
     body = {"devicetype": "hue_claude_lamp#claude_code"}
@@ -50,15 +70,20 @@ def create_username(bridge_ip):
     print(">>> Press the button on your Hue Bridge, then press Enter here. <<<")
     input()
 
-    # Try a few times in case the button press timing is tight
-    for attempt in range(5):
+    # Poll until the bridge accepts the button press
+    start = time.monotonic()
+    deadline = start + AUTH_TIMEOUT
+    waiting_reported = False
+    failure_reported = False
+    while time.monotonic() < deadline:
         try:
-            resp = requests.post(url, json=body, timeout=5)
+            resp = pool.request("POST", url, json=body, timeout=5.0)
             result = resp.json()
-        except requests.RequestException as e:
-            print(f"Request failed: {e}")
-            time.sleep(2)
-            continue
+        except (urllib3.exceptions.HTTPError, json.JSONDecodeError) as e:
+            if not failure_reported:
+                print(f"Request failed: {e}. Retrying for up to {AUTH_TIMEOUT}s...")
+                failure_reported = True
+            result = None
 
         if isinstance(result, list) and result:
             entry = result[0]
@@ -68,24 +93,29 @@ def create_username(bridge_ip):
                 return username
             if "error" in entry:
                 error = entry["error"]
-                if error.get("type") == 101:
-                    print(f"Bridge button not pressed yet. Retrying ({attempt + 1}/5)...")
-                    time.sleep(3)
-                    continue
-                print(f"Bridge error: {error.get('description', error)}")
-                return None
+                if error.get("type") != 101:
+                    print(f"Bridge error: {error.get('description', error)}")
+                    return None
+                if not waiting_reported:
+                    print(f"Bridge button not pressed yet. Waiting up to {AUTH_TIMEOUT}s...")
+                    waiting_reported = True
+
+        if time.monotonic() - start < AUTH_FAST_POLL_WINDOW:
+            time.sleep(AUTH_FAST_POLL_INTERVAL)
+        else:
+            time.sleep(AUTH_POLL_INTERVAL)
 
     print("Could not authenticate. Make sure you press the bridge button first.")
     return None
 
 
-def list_lights(bridge_ip, username):
+def list_lights(pool, bridge_ip, username):
     """Fetch all lights from the bridge."""
     url = f"http://{bridge_ip}/api/{username}/lights"
     try:
-        resp = requests.get(url, timeout=5)
+        resp = pool.request("GET", url, timeout=5.0)
         return resp.json()
-    except requests.RequestException as e:
+    except (urllib3.exceptions.HTTPError, json.JSONDecodeError) as e:
         print(f"Failed to get lights: {e}")
         return {}
 
@@ -115,14 +145,14 @@ def pick_light(lights):
         print("Invalid choice, try again.")
 
 
-def test_light(bridge_ip, username, light_id):
+def test_light(pool, bridge_ip, username, light_id):
     """Flash the selected light green to confirm it works."""
     url = f"http://{bridge_ip}/api/{username}/lights/{light_id}/state"
     # Flash green
-    requests.put(url, json={"on": True, "xy": [0.21, 0.71], "bri": 254, "alert": "select"}, timeout=5)
+    pool.request("PUT", url, json={"on": True, "xy": [0.21, 0.71], "bri": 254, "alert": "select"}, timeout=5.0)
     time.sleep(2)
     # Return to previous state
-    requests.put(url, json={"alert": "none"}, timeout=5)
+    pool.request("PUT", url, json={"alert": "none"}, timeout=5.0)
 
 
 def save_config(bridge_ip, username, light_id, light_name):
@@ -146,8 +176,10 @@ def main():
     print("=" * 50)
     print()
 
+    pool = make_pool()
+
     # Step 1: Discover bridge
-    bridge_ip = discover_bridge()
+    bridge_ip = discover_bridge(pool)
     if not bridge_ip:
         manual = input("Enter bridge IP manually (or press Enter to quit): ").strip()
         if not manual:
@@ -155,19 +187,19 @@ def main():
         bridge_ip = manual
 
     # Step 2: Authenticate
-    username = create_username(bridge_ip)
+    username = create_username(pool, bridge_ip)
     if not username:
         sys.exit(1)
 
     # Step 3: Pick a light
-    lights = list_lights(bridge_ip, username)
+    lights = list_lights(pool, bridge_ip, username)
     light_id, light_name = pick_light(lights)
     if not light_id:
         sys.exit(1)
 
     # Step 4: Test it
     print(f"\nTesting '{light_name}'... (should flash green)")
-    test_light(bridge_ip, username, light_id)
+    test_light(pool, bridge_ip, username, light_id)
 
     # Step 5: Save config
     print()
@@ -20,7 +20,7 @@ if ! command -v python3 &>/dev/null; then
 fi
 echo "Found Python 3: $(python3 --version)"
 
-# Step 2: Install requests
+# Step 2: Install Python dependencies
 echo
 echo "Installing Python dependencies..."
 python3 -m pip install --quiet -r "$SCRIPT_DIR/requirements.txt"